@@ -4,6 +4,10 @@ from torch.utils.data import Dataset
 from torch.nn.utils.rnn import pad_sequence
 
 # Other libraries
+import re
+import itertools
+import numpy as np
+from collections import Counter
 from PIL import Image
 import pandas as pd
 from gensim.models import KeyedVectors
@@ -12,6 +16,37 @@ from gensim.models import KeyedVectors
 import warnings
 warnings.filterwarnings("ignore")
 
+# Quotes removed from the captions and runs of whitespace
+QUOTES_TABLE = str.maketrans("", "", "\"'")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Single character punctuation and the token that replaces it
+PUNCTUATION_TABLE = str.maketrans({".": " <PERIOD> ",
+                                   ",": " <COMMA> ",
+                                   '"': " <QUOTATION_MARK> ",
+                                   ";": " <SEMICOLON> ",
+                                   "!": " <EXCLAMATION_MARK> ",
+                                   "?": " <QUESTION_MARK> ",
+                                   "(": " <LEFT_PAREN> ",
+                                   ")": " <RIGHT_PAREN> ",
+                                   ":": " <COLON> "})
+HYPHENS_RE = re.compile(r"--")
+
+# Tokens (with their surrounding spaces) and the text that replaces them
+UNTOKEN_MAP = {" <PERIOD> ": ".",
+               " <COMMA> ": ",",
+               " <QUOTATION_MARK> ": '"',
+               " <SEMICOLON> ": ";",
+               " <EXCLAMATION_MARK> ": "!",
+               " <QUESTION_MARK> ": "?",
+               " <LEFT_PAREN> ": "(",
+               " <RIGHT_PAREN> ": ")",
+               " <HYPHENS> ": "--",
+               " <COLON> ": ":",
+               "<s>": "",
+               "</s>": ""}
+UNTOKEN_RE = re.compile("|".join(map(re.escape, UNTOKEN_MAP)))
+
 
 class Vocabulary:
     def __init__(self, freq_threshold: int) -> None:
@@ -22,14 +57,10 @@ class Vocabulary:
             freq_threshold (int): The frequency threshold for including
             a word in the vocabulary.
         """
-        self.idx2word = {0: "<PAD>",
-                         1: "<s>",
-                         2: "</s>",
-                         3: "<UNK>"}
-        self.word2idx = {"<PAD>": 0,
-                         "<s>": 1,
-                         "</s>": 2,
-                         "<UNK>": 3}
+        # The indices are the positions in the list, so no hashing
+        # is needed to translate them back to words
+        self.idx2word = ["<PAD>", "<s>", "</s>", "<UNK>"]
+        self.word2idx = {word: idx for idx, word in enumerate(self.idx2word)}
         self.freq_threshold = freq_threshold
 
     def __len__(self) -> int:
@@ -57,27 +88,14 @@ class Vocabulary:
             list: list of tokens.
         """
 
-        text = text.lower().replace('"', '').replace("'", '')
-
-        if text[-1] == '.':
-            text = text[:-1]
-
-        text = text.strip()
-        text = " ".join(text.split())
+        text = text.lower().translate(QUOTES_TABLE).removesuffix(".")
+        text = WHITESPACE_RE.sub(" ", text).strip()
         text = "<s> " + text + " </s>"
 
         if extra_tokens:
-            text = text.replace(".", " <PERIOD> ")
-            text = text.replace(",", " <COMMA> ")
-            text = text.replace('"', " <QUOTATION_MARK> ")
-            text = text.replace(";", " <SEMICOLON> ")
-            text = text.replace("!", " <EXCLAMATION_MARK> ")
-            text = text.replace("?", " <QUESTION_MARK> ")
-            text = text.replace("(", " <LEFT_PAREN> ")
-            text = text.replace(")", " <RIGHT_PAREN> ")
-            text = text.replace("--", " <HYPHENS> ")
-            text = text.replace("?", " <QUESTION_MARK> ")
-            text = text.replace(":", " <COLON> ")
+            # Replace all the punctuation in a single pass
+            text = text.translate(PUNCTUATION_TABLE)
+            text = HYPHENS_RE.sub(" <HYPHENS> ", text)
         return text.split(" ")
 
     @staticmethod
@@ -94,19 +112,13 @@ class Vocabulary:
         """
 
         text = " ".join(tokens)
-        text = text.replace(" <PERIOD> ", ".")
-        text = text.replace(" <COMMA> ", ",")
-        text = text.replace(" <QUOTATION_MARK> ", '"')
-        text = text.replace(" <SEMICOLON> ", ";")
-        text = text.replace(" <EXCLAMATION_MARK> ", "!")
-        text = text.replace(" <QUESTION_MARK> ", "?")
-        text = text.replace(" <LEFT_PAREN> ", "(")
-        text = text.replace(" <RIGHT_PAREN> ", ")")
-        text = text.replace(" <HYPHENS> ", "--")
-        text = text.replace(" <QUESTION_MARK> ", "?")
-        text = text.replace(" <COLON> ", ":")
-        text = text.replace("<s>", "")
-        text = text.replace("</s>", "")
+
+        # Nothing to replace if there are no tokens in the text
+        if "<" not in text:
+            return text
+
+        # Replace all the tokens in a single pass
+        text = UNTOKEN_RE.sub(lambda match: UNTOKEN_MAP[match.group(0)], text)
 
         return text
 
@@ -121,19 +133,14 @@ class Vocabulary:
         Returns:
             None
         """
-        frequencies = {}
-        idx = len(self.idx2word)
+        frequencies: Counter = Counter()
         for sentence in sentences:
             for word in self.tokenizer(sentence):
-                if word not in frequencies:
-                    frequencies[word] = 1
-                else:
-                    frequencies[word] += 1
+                frequencies[word] += 1
                 if (frequencies[word] == self.freq_threshold
                    and word not in self.word2idx):
-                    self.word2idx[word] = idx
-                    self.idx2word[idx] = word
-                    idx += 1
+                    self.word2idx[word] = len(self.idx2word)
+                    self.idx2word.append(word)
 
     def caption_to_indices(self, caption: str) -> list:
         """
@@ -219,6 +226,10 @@ class ImageAndCaptionsDataset(Dataset):
         transform (callable): transform to apply to the images.
         image_names (pd.Series): series with the image names.
         vocab (Vocabulary): vocabulary object.
+        caption_ids (np.ndarray): word indices of all the captions
+        concatenated.
+        caption_offsets (np.ndarray): position in caption_ids where each
+        caption starts, plus the total length at the end.
     """
     def __init__(self,
                  captions_path: str,
@@ -249,6 +260,18 @@ class ImageAndCaptionsDataset(Dataset):
             self.vocab = Vocabulary(freq_threshold=5)
             self.vocab.build_vocabulary(self.captions.tolist())
 
+        # Convert the captions to indices only once and store them
+        # in a flat array, with the offsets where each caption starts
+        captions_indices = [self.vocab.caption_to_indices(caption)
+                            for caption in self.captions]
+        lengths = [len(indices) for indices in captions_indices]
+        all_indices = itertools.chain.from_iterable(captions_indices)
+        self.caption_ids = np.fromiter(all_indices,
+                                       dtype=np.int32,
+                                       count=sum(lengths))
+        self.caption_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.caption_offsets[1:])
+
     def __len__(self):
         """
         Return the length of the dataset.
@@ -268,18 +291,18 @@ class ImageAndCaptionsDataset(Dataset):
         Returns:
             tuple: tuple with the image and the tokenized caption.
         """
-        # Load image path and captions
+        # Load image path
         image_path = self.image_names[index]
-        caption = self.captions[index]
 
         # Load image transforming it to tensor
         image = Image.open(self.images_path + "/" + image_path)
         if self.transform:
             image = self.transform(image)
 
-        # Convert caption to indices
-        caption_ids = self.vocab.caption_to_indices(caption)
-        captions_tensor = torch.tensor(caption_ids)
+        # Get the caption indices without copying them
+        start = self.caption_offsets[index]
+        end = self.caption_offsets[index + 1]
+        captions_tensor = torch.from_numpy(self.caption_ids[start:end])
 
         return image_path, image, captions_tensor
 
@@ -1,13 +1,32 @@
-# deep learning libraries
-from torchvision import transforms
-
 # other libraries
 import os
+import csv
+from concurrent.futures import ProcessPoolExecutor
 import kaggle
 import shutil
 from PIL import Image
 
-import pandas as pd
+# Size of the images saved on disk
+IMAGE_SIZE: tuple = (356, 356)
+
+
+def resize_and_save_image(image_path: str, save_path: str) -> None:
+    """
+    Open an image, resize it to IMAGE_SIZE and save it as a JPEG.
+
+    Args:
+        image_path (str): path of the original image.
+        save_path (str): path where the resized image is saved.
+    """
+    image = Image.open(image_path)
+
+    # Let the JPEG decoder downscale while decoding (no-op for other formats)
+    image.draft("RGB", IMAGE_SIZE)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image = image.resize(IMAGE_SIZE, Image.BILINEAR)
+    image.save(save_path, format="JPEG", optimize=False, quality=90)
 
 
 def download_and_prepare_dataset(path: str, dataset_name: str) -> None:
@@ -31,8 +50,7 @@ def download_and_prepare_dataset(path: str, dataset_name: str) -> None:
     kaggle.api.authenticate()
 
     # Create path if it doesn't exist
-    if not os.path.exists(path):
-        os.makedirs(path)
+    os.makedirs(path, exist_ok=True)
 
     if dataset_name == "flickr8k":
         dataset_path = f"{path}/flickr8k"
@@ -47,27 +65,17 @@ def download_and_prepare_dataset(path: str, dataset_name: str) -> None:
                                           unzip=True)
 
         # Prepare directories for processed data
-        if not os.path.exists(f"{dataset_path}/train"):
-            os.makedirs(f"{dataset_path}/train")
-        if not os.path.exists(f"{dataset_path}/val"):
-            os.makedirs(f"{dataset_path}/val")
-        if not os.path.exists(f"{dataset_path}/test"):
-            os.makedirs(f"{dataset_path}/test")
-
-        # For inception dataset
-        transform = transforms.Compose(
-            [
-                # transforms.Resize((299, 299)),
-                transforms.Resize((356, 356))
-            ]
-        )
+        list_splits = ["train", "val", "test"]
+        for split in list_splits:
+            os.makedirs(f"{dataset_path}/{split}", exist_ok=True)
 
         if dataset_name == "flickr8k":
             images_path = f"{dataset_path}/Images"
         else:
             images_path = f"{dataset_path}/flickr30k_images"
 
-        images_list = os.listdir(images_path)
+        with os.scandir(images_path) as entries:
+            images_list = [entry.name for entry in entries if entry.is_file()]
 
         # Split into train and validation
         # 80% train, 20% validation
@@ -79,19 +87,26 @@ def download_and_prepare_dataset(path: str, dataset_name: str) -> None:
         train_images = train_images[: int(len(train_images) * 0.8)]
 
         # Process and save images
-        list_splits = ["train", "val", "test"]
         list_class_dirs = [train_images, val_images, test_images]
 
-        for i in range(len(list_splits)):
+        # Images are independent, so resize them in parallel
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for i in range(len(list_splits)):
+
+                split = list_splits[i]
+                list_images = list_class_dirs[i]
 
-            split = list_splits[i]
-            list_images = list_class_dirs[i]
+                split_path = os.path.join(dataset_path, split)
+                image_paths = [os.path.join(images_path, image_file)
+                               for image_file in list_images]
+                save_paths = [os.path.join(split_path, image_file)
+                              for image_file in list_images]
 
-            for image_file in list_images:
-                image_path = f"{images_path}/{image_file}"
-                image = Image.open(image_path).convert("RGB")
-                image = transform(image)
-                image.save(f"{dataset_path}/{split}/{image_file}")
+                # Consume the iterator so errors in the workers are raised
+                list(executor.map(resize_and_save_image,
+                                  image_paths,
+                                  save_paths,
+                                  chunksize=64))
 
         shutil.rmtree(images_path)
 
@@ -106,34 +121,46 @@ def divide_captions(path: str) -> None:
     Args:
         path (str): path where the data was downloaded.
     """
-    # Open the captions.txt file as a DataFrame
     captions_path = path + "/captions.txt"
 
     # Separate the images into train, validation and test sets
     # Only if the images are not already separated
     if os.path.exists(captions_path):
 
-        df_captions = pd.read_csv(captions_path, sep=',')
-
-        # If it's the Flickr30k dataset, change the column names to match
-        # the Flickr8k dataset
-        if 'image' not in df_captions.columns:
-            df_captions = df_captions.drop(columns=['comment_number'])
-            df_captions.columns = ['image', 'caption']
-
-        images_train = os.listdir(path + '/train')
-        images_val = os.listdir(path + '/val')
-        images_test = os.listdir(path + '/test')
-
-        # Filter the captions for each set
-        df_captions_train = df_captions[df_captions['image'].isin(images_train)]
-        df_captions_val = df_captions[df_captions['image'].isin(images_val)]
-        df_captions_test = df_captions[df_captions['image'].isin(images_test)]
+        # Map each image to the set it belongs to
+        list_splits = ["train", "val", "test"]
+        image_to_split = {}
+        for split in list_splits:
+            for image_file in os.listdir(path + '/' + split):
+                image_to_split[image_file] = split
+
+        captions_splits: dict = {split: [] for split in list_splits}
+
+        # Stream the captions.txt file, assigning each row to its set
+        with open(captions_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+
+            # The Flickr30k dataset has an extra comment_number column
+            image_idx, caption_idx = [i for i, column in enumerate(header)
+                                      if column != 'comment_number']
+
+            for row in reader:
+                if not row:
+                    continue
+                split = image_to_split.get(row[image_idx])
+                if split is not None:
+                    captions_splits[split].append((row[image_idx],
+                                                   row[caption_idx]))
 
         # Save the captions for each set in a txt file
-        df_captions_train.to_csv(path + "/captions_train.txt", index=False)
-        df_captions_val.to_csv(path + "/captions_val.txt", index=False)
-        df_captions_test.to_csv(path + "/captions_test.txt", index=False)
+        for split in list_splits:
+            captions_split_path = path + f"/captions_{split}.txt"
+            with open(captions_split_path, 'w',
+                      newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(['image', 'caption'])
+                writer.writerows(captions_splits[split])
 
         # Remove the captions.txt file
         os.remove(os.path.join(path, 'captions.txt'))
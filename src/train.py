@@ -48,6 +48,9 @@ def main() -> None:
     (train_loader, val_loader, _,
      vocab) = load_data(DATA_PATH, dataset_name, batch_size)
 
+    # Gradient scaler for mixed precision training (only on GPU)
+    scaler = torch.amp.GradScaler("cuda", enabled=device.type == "cuda")
+
     if need_to_load:
 
         # Define the type of model as well as the optimizer
@@ -64,7 +67,8 @@ def main() -> None:
         # Load the model from the checkpoint
         last_epoch, model, optimizer_loaded = load_checkpoint(model_type,
                                                               optimizer,
-                                                              CHECKPOINT_PATH
+                                                              CHECKPOINT_PATH,
+                                                              scaler=scaler
                                                               )
         model.to(device)
 
@@ -107,20 +111,28 @@ def main() -> None:
     # define tensorboard writer
     writer = SummaryWriter()
 
+    # Compile the model once, only on GPU. The original model is the one
+    # saved in the checkpoints so the keys of the state dict do not change
+    if device.type == "cuda":
+        compiled_model = torch.compile(model)
+    else:
+        compiled_model = model
+
     # train model showing progress
     for epoch in range(start_epoch, epochs):
 
         print(f"Epoch {epoch + 1}/{epochs}")
 
         # Perform training and validation steps
-        train_step(model,
+        train_step(compiled_model,
                    train_loader,
                    loss,
                    optimizer,
                    writer,
                    epoch,
-                   device)
-        val_step(model,
+                   device,
+                   scaler)
+        val_step(compiled_model,
                  val_loader,
                  loss,
                  writer,
@@ -128,7 +140,7 @@ def main() -> None:
                  device)
 
         # Save a checkpoint into the checkpoint folder
-        save_checkpoint(model, optimizer, epoch, 'checkpoint')
+        save_checkpoint(model, optimizer, epoch, 'checkpoint', scaler=scaler)
 
         # We save a checkpoint every 10 epochs into an specific folder
         # for the model
@@ -137,10 +149,11 @@ def main() -> None:
                             optimizer,
                             epoch,
                             checkpoint_save_path,
-                            f"checkpoint_{epoch}")
+                            f"checkpoint_{epoch}",
+                            scaler=scaler)
 
     # Save the model into the models folder
-    save_checkpoint(model, optimizer, epochs, "models", "model")
+    save_checkpoint(model, optimizer, epochs, "models", "model", scaler=scaler)
     print("Training finished.")
 
 
@@ -15,54 +15,74 @@ def train_step(
     writer: SummaryWriter,
     epoch: int,
     device: torch.device,
+    scaler: torch.amp.GradScaler,
+    verbose: bool = True,
 ) -> None:
     """
     This function train the model.
 
     Args:
-        model (torch.nn.Module): model to train.
+        model (torch.nn.Module): model to train. It must already be
+        on the device.
         train_data (DataLoader): dataloader of training data.
         loss (torch.nn.Module): loss function.
         optimizer (torch.optim.Optimizer): optimizer.
         writer (SummaryWriter): writer for tensorboard.
         epoch (int): epoch of the training.
         device (torch.device): device for running operations.
+        scaler (torch.amp.GradScaler): gradient scaler for mixed
+        precision. If it is enabled the forward pass runs in float16,
+        otherwise the model is trained in float32.
+        verbose (bool): whether to show a progress bar.
     """
 
-    # Model to device
-    model.to(device)
-
     # Model in training mode
     model.train()
 
-    # Lists to store losses
-    losses_train = []
+    # Accumulate the losses on the device to avoid a sync per batch
+    loss_sum = torch.zeros((), device=device)
+    num_batches = 0
+
+    # Progress bar with few redraws so it does not slow down the loop
+    progress_bar = tqdm.tqdm(train_data,
+                             mininterval=2.0,
+                             miniters=50,
+                             leave=False,
+                             disable=not verbose)
 
-    for _, inputs, targets in tqdm.tqdm(train_data):
+    for _, inputs, targets in progress_bar:
 
-        inputs = inputs.to(device)
-        targets = targets.to(device)
+        # Batches are in pinned memory, so the copy can be asynchronous
+        inputs = inputs.to(device, non_blocking=True)
+        targets = targets.to(device, non_blocking=True)
 
         # Inputs must be float
         inputs = inputs.float()
         targets = targets.long()
 
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)
 
-        outputs = model(inputs, targets[:-1])
+        # Forward pass in mixed precision when the scaler is enabled
+        with torch.autocast(device_type=device.type,
+                            dtype=torch.float16,
+                            enabled=scaler.is_enabled()):
+            outputs = model(inputs, targets[:-1])
 
-        # Reshape outputs and targets to calculate the loss
-        outputs_reshaped = outputs.reshape(-1, outputs.shape[2])
-        targets_reshaped = targets.reshape(-1)
+            # Reshape outputs and targets to calculate the loss
+            outputs_reshaped = outputs.reshape(-1, outputs.shape[2])
+            targets_reshaped = targets.reshape(-1)
 
-        loss_value = loss(outputs_reshaped, targets_reshaped)
+            loss_value = loss(outputs_reshaped, targets_reshaped)
 
-        loss_value.backward()
-        optimizer.step()
+        # Scale the loss to avoid underflow of the float16 gradients
+        scaler.scale(loss_value).backward()
+        scaler.step(optimizer)
+        scaler.update()
 
-        losses_train.append(loss_value.item())
+        loss_sum += loss_value.detach()
+        num_batches += 1
 
-    loss_mean = sum(losses_train) / len(losses_train)
+    loss_mean = (loss_sum / num_batches).item()
     writer.add_scalar("Loss/train", loss_mean, epoch)
 
 
@@ -73,33 +93,42 @@ def val_step(
     loss: torch.nn.Module,
     writer: SummaryWriter,
     epoch: int,
-    device: torch.device
+    device: torch.device,
+    verbose: bool = True,
 ) -> None:
     """
     This function validate the model.
 
     Args:
-        model (torch.nn.Module): model to validate.
+        model (torch.nn.Module): model to validate. It must already be
+        on the device.
         val_data (DataLoader): dataloader of validation data.
         loss (torch.nn.Module): loss function.
         writer (SummaryWriter): writer for tensorboard.
         epoch (int): epoch of the validation.
         device (torch.device): device for running operations.
+        verbose (bool): whether to show a progress bar.
     """
 
-    # Model to device
-    model.to(device)
-
     # Model in evaluation mode
     model.eval()
 
-    # To save the losses
-    losses_val = []
+    # Accumulate the losses on the device to avoid a sync per batch
+    loss_sum = torch.zeros((), device=device)
+    num_batches = 0
+
+    # Progress bar with few redraws so it does not slow down the loop
+    progress_bar = tqdm.tqdm(val_data,
+                             mininterval=2.0,
+                             miniters=50,
+                             leave=False,
+                             disable=not verbose)
 
-    for _, inputs, targets in tqdm.tqdm(val_data):
+    for _, inputs, targets in progress_bar:
 
-        inputs = inputs.to(device)
-        targets = targets.to(device)
+        # Batches are in pinned memory, so the copy can be asynchronous
+        inputs = inputs.to(device, non_blocking=True)
+        targets = targets.to(device, non_blocking=True)
 
         # Inputs must be float
         inputs = inputs.float()
@@ -113,7 +142,8 @@ def val_step(
 
         loss_value = loss(outputs_reshaped, targets_reshaped)
 
-        losses_val.append(loss_value.item())
+        loss_sum += loss_value
+        num_batches += 1
 
-    loss_mean = sum(losses_val) / len(losses_val)
+    loss_mean = (loss_sum / num_batches).item()
     writer.add_scalar("Loss/val", loss_mean, epoch)
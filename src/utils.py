@@ -8,7 +8,7 @@ from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
 from pycocoevalcap.cider.cider import Cider
 
 # Libraries for Data processing
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
 
 # Libraries for Visualization
 import matplotlib.pyplot as plt
@@ -58,6 +58,51 @@ def set_seed(seed: int) -> None:
     return None
 
 
+def build_loader(
+    dataset: Dataset,
+    batch_size: int,
+    collate_fn: CollateFn,
+    shuffle: bool = True,
+    drop_last: bool = True,
+    num_workers: int = 2,
+    pin_memory: bool = torch.cuda.is_available(),
+    prefetch_factor: int = 4,
+) -> DataLoader:
+    """
+    This function creates a dataloader that keeps its workers alive
+    between epochs and prefetches batches ahead of the training loop.
+
+    Args:
+        dataset (Dataset): dataset to load.
+        batch_size (int): size of the batch.
+        collate_fn (CollateFn): function to merge the samples of a batch.
+        shuffle (bool): whether to shuffle the data.
+        drop_last (bool): whether to drop the last batch if it is smaller
+        than the batch size.
+        num_workers (int): number of workers to load the data.
+        pin_memory (bool): whether to load the batches into pinned memory.
+        By default only when CUDA is available.
+        prefetch_factor (int): number of batches loaded in advance by
+        each worker.
+
+    Returns:
+        DataLoader: dataloader of the dataset.
+    """
+    # Persistent workers and prefetching are only available with workers
+    use_workers = num_workers > 0
+
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        drop_last=drop_last,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        persistent_workers=use_workers,
+        prefetch_factor=prefetch_factor if use_workers else None,
+        collate_fn=collate_fn)
+
+
 def load_data(
     path: str,
     dataset_name: str,
@@ -65,6 +110,7 @@ def load_data(
     shuffle: bool = True,
     drop_last: bool = True,
     num_workers: int = 2,
+    pin_memory: bool = torch.cuda.is_available(),
 ) -> tuple[DataLoader, DataLoader, DataLoader, Vocabulary]:
     """
     This function loads the data and preprocesses it.
@@ -78,6 +124,9 @@ def load_data(
         drop_last (bool): whether to drop the last batch if it is smaller
         than the batch size.
         num_workers (int): number of workers to load the data.
+        pin_memory (bool): whether to load the batches into pinned memory
+        so they can be copied asynchronously to the GPU. By default only
+        when CUDA is available.
 
     Returns:
         tuple[DataLoader, DataLoader, DataLoader, dict, dict]: tuple with
@@ -139,29 +188,28 @@ def load_data(
                                            vocab=vocab)
 
     # Create dataloaders
-    train_loader = DataLoader(
-        train_dataset,
-        batch_size=batch_size,
-        shuffle=shuffle,
-        drop_last=drop_last,
-        num_workers=num_workers,
-        collate_fn=CollateFn(pad_idx))
-
-    val_loader = DataLoader(
-        val_dataset,
-        batch_size=batch_size,
-        shuffle=False,
-        drop_last=drop_last,
-        num_workers=num_workers,
-        collate_fn=CollateFn(pad_idx))
-
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=batch_size,
-        shuffle=False,
-        drop_last=drop_last,
-        num_workers=num_workers,
-        collate_fn=CollateFn(pad_idx))
+    collate_fn = CollateFn(pad_idx)
+    train_loader = build_loader(train_dataset,
+                                batch_size,
+                                collate_fn,
+                                shuffle=shuffle,
+                                drop_last=drop_last,
+                                num_workers=num_workers,
+                                pin_memory=pin_memory)
+    val_loader = build_loader(val_dataset,
+                              batch_size,
+                              collate_fn,
+                              shuffle=False,
+                              drop_last=drop_last,
+                              num_workers=num_workers,
+                              pin_memory=pin_memory)
+    test_loader = build_loader(test_dataset,
+                               batch_size,
+                               collate_fn,
+                               shuffle=False,
+                               drop_last=drop_last,
+                               num_workers=num_workers,
+                               pin_memory=pin_memory)
 
     return train_loader, val_loader, test_loader, vocab
 
@@ -172,6 +220,7 @@ def save_checkpoint(
     epoch: int,
     path: str,
     name: str = "checkpoint",
+    scaler: Optional[torch.amp.GradScaler] = None,
 ) -> None:
     """
     This function saves a checkpoint of the model and optimizer.
@@ -181,20 +230,26 @@ def save_checkpoint(
         optimizer (torch.optim.Optimizer): optimizer to save.
         epoch (int): epoch number.
         path (str): path to save the checkpoint.
+        scaler (torch.amp.GradScaler): gradient scaler to save, if any.
+        It is only saved if it is enabled.
     """
     # Create folder if it does not exist
     if not os.path.isdir(path):
         os.makedirs(path)
 
+    checkpoint = {
+        "epoch": epoch,
+        "model_state_dict": model.state_dict(),
+        "optimizer_state_dict": optimizer.state_dict(),
+    }
+
+    # Keep the loss scale so it is not reset when training is resumed.
+    # A disabled scaler has no state, so there is nothing to save
+    if scaler is not None and scaler.is_enabled():
+        checkpoint["scaler_state_dict"] = scaler.state_dict()
+
     # Save the checkpoint
-    torch.save(
-        {
-            "epoch": epoch,
-            "model_state_dict": model.state_dict(),
-            "optimizer_state_dict": optimizer.state_dict(),
-        },
-        f"{path}/{name}.pth",
-    )
+    torch.save(checkpoint, f"{path}/{name}.pth")
     print(f"Checkpoint saved at '{path}/{name}.pth'")
     return None
 
@@ -204,6 +259,7 @@ def load_checkpoint(
     optimizer: Optional[torch.optim.Optimizer],
     path: str,
     name: str = "checkpoint",
+    scaler: Optional[torch.amp.GradScaler] = None,
 ) -> tuple[int, torch.nn.Module, Optional[torch.optim.Optimizer]]:
     """
     This function loads a checkpoint of the model and optimizer.
@@ -212,6 +268,9 @@ def load_checkpoint(
         model (torch.nn.Module): model to load.
         optimizer (torch.optim.Optimizer): optimizer to load.
         path (str): path to load the checkpoint.
+        scaler (torch.amp.GradScaler): gradient scaler to load in place,
+        if any. It is left unchanged if the checkpoint has no scaler
+        state or the stored state is empty (saved by a disabled scaler).
 
     Returns:
         tuple[int, torch.nn.Module, torch.optim.Optimizer]: epoch number,
@@ -226,6 +285,8 @@ def load_checkpoint(
     model.load_state_dict(checkpoint["model_state_dict"])
     if optimizer:
         optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+    if scaler is not None and checkpoint.get("scaler_state_dict"):
+        scaler.load_state_dict(checkpoint["scaler_state_dict"])
 
     return checkpoint["epoch"], model, optimizer
 